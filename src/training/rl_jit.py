@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""rl_jit.py – Numba で JIT 化した Monte‑Carlo 学習ループ
+
+*   rl_tictactoe.MonteCarloAgent と同じ方策・報酬・ε 減衰をそのまま移植
+*   盤面は packed int (o<<9 | x)、Q / N は numba.typed.Dict[int64, float64[:]]
+*   状態キーは rl_tictactoe._canonical と同じく 8 対称で正規化
+*   1 エピソード分のロールアウトと MC 更新を丸ごと @njit で実行
+*   学習結果は agent.Q / agent.N に書き戻すので save() 以降は共通
+*   相手 ◯ は常にランダム (agent.opponent_pool は使わない)
+*   依存: numpy, numba (学習時のみ。推論側には不要)
+"""
+
+from __future__ import annotations
+import numpy as np
+from numba import njit, types
+from numba.typed import Dict as TypedDict
+
+from rl_tictactoe import TicTacToeEnv, MonteCarloAgent, evaluate, _WIN_MASKS, _SYMS, _SYM_MASK
+
+_WINS      = np.array(_WIN_MASKS, dtype=np.int64)
+_PERMS     = np.array(_SYMS, dtype=np.int64)      # (8, 9)
+_SYM_MASKS = np.array(_SYM_MASK, dtype=np.int64)  # (8, 512)
+_FULL = 0x1FF
+
+################################################################################
+# JIT ヘルパー
+################################################################################
+@njit(cache=True)
+def _seed(seed):
+    np.random.seed(seed)
+
+@njit(cache=True)
+def _winner(o, x, wins):
+    for m in wins:
+        if o & m == m:
+            return 1
+        if x & m == m:
+            return -1
+    return 0
+
+@njit(cache=True)
+def _canonical(o, x, sym_masks):
+    best, best_k = (o << 9) | x, 0
+    for k in range(1, 8):
+        key = (sym_masks[k, o] << 9) | sym_masks[k, x]
+        if key < best:
+            best, best_k = key, k
+    return best, best_k
+
+@njit(cache=True)
+def _random_legal(o, x):
+    empty = ~(o | x) & _FULL
+    n = 0
+    e = empty
+    while e:
+        e &= e - 1
+        n += 1
+    k = np.random.randint(n)
+    while k:
+        empty &= empty - 1
+        k -= 1
+    lsb = empty & -empty
+    a = 0
+    while lsb > 1:
+        lsb >>= 1
+        a += 1
+    return a
+
+@njit(cache=True)
+def _greedy(q, perm, o, x):
+    # Q 最大の合法手 (同値は reservoir sampling で乱択)。q は代表盤面の座標
+    best_q = -np.inf
+    best_a = -1
+    ties = 0
+    for a in range(9):
+        if (o | x) >> a & 1:
+            continue
+        v = q[perm[a]]
+        if v > best_q:
+            best_q = v
+            best_a = a
+            ties = 1
+        elif v == best_q:
+            ties += 1
+            if np.random.randint(ties) == 0:
+                best_a = a
+    return best_a
+
+@njit(cache=True)
+def play_one_episode(Q, N, eps, gamma, min_alpha, step_penalty, win_reward, draw_reward,
+                     wins, perms, sym_masks):
+    states  = np.empty(5, dtype=np.int64)
+    actions = np.empty(5, dtype=np.int64)
+    rewards = np.empty(5, dtype=np.float64)
+    L = 0
+
+    # ❶ 先手 ◯ (ランダム)
+    o = 1 << _random_legal(0, 0)
+    x = 0
+
+    while True:
+        # ❷ エージェント ×
+        key, k = _canonical(o, x, sym_masks)
+        if key not in Q:
+            Q[key] = np.zeros(9)
+            N[key] = np.zeros(9)
+        if np.random.random() < eps:
+            act = _random_legal(o, x)
+        else:
+            act = _greedy(Q[key], perms[k], o, x)
+        x |= 1 << act
+
+        states[L]  = key
+        actions[L] = perms[k, act]
+        # 自分視点の報酬 (+1=勝,中間 step_penalty)
+        done = True
+        if _winner(o, x, wins) == -1:
+            rewards[L] = win_reward
+        elif (o | x) == _FULL:
+            rewards[L] = draw_reward
+        else:
+            rewards[L] = step_penalty
+            done = False
+        L += 1
+        if done:
+            break
+
+        # ❸ 相手 ◯ 手 (ランダム)
+        o |= 1 << _random_legal(o, x)
+        if _winner(o, x, wins) != 0 or (o | x) == _FULL:
+            break
+
+    # Monte‑Carlo 価値更新 (後ろから累積)
+    G = 0.0
+    for t in range(L - 1, -1, -1):
+        G = rewards[t] + gamma * G
+        s, a = states[t], actions[t]
+        n = N[s]
+        q = Q[s]
+        n[a] += 1.0
+        alpha = max(1.0 / n[a], min_alpha)
+        q[a] += alpha * (G - q[a])
+
+@njit(cache=True)
+def _train_range(Q, N, start, stop, total, eps_start, eps_end, gamma, min_alpha,
+                 step_penalty, win_reward, draw_reward, wins, perms, sym_masks):
+    for ep in range(start, stop):
+        eps = max(eps_end, eps_start * (1.0 - ep / total))
+        play_one_episode(Q, N, eps, gamma, min_alpha, step_penalty,
+                         win_reward, draw_reward, wins, perms, sym_masks)
+
+################################################################################
+# Python 側エントリポイント
+################################################################################
+def train_jit(agent: MonteCarloAgent, episodes: int, *, report: int = 0, seed: int | None = None):
+    """agent の設定で `episodes` 回学習し、結果を agent.Q / agent.N に書き戻す."""
+    if seed is not None:
+        _seed(seed)
+
+    Q = TypedDict.empty(types.int64, types.float64[:])
+    N = TypedDict.empty(types.int64, types.float64[:])
+    for k, v in agent.Q.items():
+        Q[k] = np.array(v, dtype=np.float64)
+        N[k] = agent._n(k).astype(np.float64)
+
+    env  = agent.env
+    step = report or episodes
+    for start in range(0, episodes, step):
+        stop = min(start + step, episodes)
+        _train_range(Q, N, start, stop, episodes, agent.eps_start, agent.eps_end,
+                     agent.gamma, agent.min_alpha, env.step_penalty,
+                     env.WIN_REWARD, env.DRAW_REWARD, _WINS, _PERMS, _SYM_MASKS)
+        if report:
+            print(f"{stop:,} episodes done")
+
+    agent.epsilon = agent.eps_end
+    agent.Q = {int(k): v.copy() for k, v in Q.items()}
+    agent.N = {int(k): v.astype(np.int64) for k, v in N.items()}
+    return agent
+
+################################################################################
+# 学習 & 評価 (スクリプト実行時)
+################################################################################
+if __name__ == "__main__":
+    env   = TicTacToeEnv(step_penalty=-0.04)
+    agent = MonteCarloAgent(env)
+
+    EPISODES = 2_000_000
+    REPORT   = 100_000
+
+    train_jit(agent, EPISODES, report=REPORT)
+
+    # 評価
+    print(f"Win rate (×後手) : {evaluate(agent, 10_000):.2%}")
+
+    agent.save("train_result/mc_tictactoe.npz")
+    print("✅ Q-table saved to train_result/mc_tictactoe.npz")
@@ -2,26 +2,30 @@
 """rl_tictactoe.py – 後手（×）専用 Monte‑Carlo 強化学習エージェント
 
 *   エージェントは常に **後手 ×**
-*   先手（◯）はランダム手　※必要なら self‑play 等に差し替え可
+*   先手（◯）はランダム手　※snapshot_opponent() で過去の自分を相手に混ぜられる
 *   ε‑greedy を線形減衰 (1.0 → 0.01) で高速収束
 *   step_penalty = ‑0.04 で「粘って勝つ」行動を許容
+*   Q / N は盤面の 8 対称 (回転・鏡映) で正規化した状態で共有
 *   終局報酬は **自分視点** (+1=勝ち, ‑1=負け, 0=引分/中間) に変換
-*   main として実行すると 2,000,000 エピソード学習→Q を保存→勝率評価
+*   main として実行すると 2,000,000 エピソードを全コアで並列学習→勝率評価→Q を保存
 """
 
 from __future__ import annotations
-from typing import List, Dict, Tuple
+from typing import Dict, List, Tuple
 from enum import Enum
-from collections import defaultdict
+from functools import lru_cache
 import copy
+import multiprocessing
 import random
 import pickle
 import os
 
+import numpy as np
+
 ################################################################################
 # 型定義 / 列挙体
 ################################################################################
-Board = List[int]  # flatten 3×3 board (len==9)
+Board = Tuple[int, int]  # (o_mask, x_mask) 各 9bit, bit i がマス i に対応
 
 class Cell(Enum):
     EMPTY = 0
@@ -31,6 +35,99 @@ class Cell(Enum):
     def __str__(self) -> str:
         return {self.EMPTY: " ", self.O: "O", self.X: "X"}[self]
 
+_FULL = 0x1FF  # 9 マスすべて埋まった状態
+
+_WIN_MASKS: Tuple[int, ...] = (
+    0o007, 0o070, 0o700,                  # rows
+    0o111, 0o222, 0o444,                  # cols
+    0o421, 0o124,                         # diagonals
+)
+
+# 空きマス 9bit マスク → 合法手のタプル / 石の数
+_LEGAL    = tuple(tuple(i for i in range(9) if m >> i & 1) for m in range(512))
+_POPCOUNT = bytes(bin(m).count("1") for m in range(512))
+
+# 9bit マスク → 揃った列を含むか (512 エントリの表引きで 8 列を一括判定)
+_WIN_TABLE = bytes(any(m & w == w for w in _WIN_MASKS) for m in range(512))
+
+def _winner_packed(o: int, x: int) -> int:
+    """+1 = O の勝ち, -1 = X の勝ち, 0 = 未決着."""
+    if _WIN_TABLE[o]:
+        return 1
+    if _WIN_TABLE[x]:
+        return -1
+    return 0
+
+def _pack_key(o: int, x: int) -> int:
+    """Q テーブル用の状態キー (o<<9 | x)."""
+    return (o << 9) | x
+
+def _symmetries() -> Tuple[Tuple[int, ...], ...]:
+    # 盤面の 8 対称 (回転 4 × 鏡映 2)。_SYMS[k][i] = マス i の移動先, k=0 は恒等
+    rot = tuple(i % 3 * 3 + 2 - i // 3 for i in range(9))
+    ref = tuple(i // 3 * 3 + 2 - i % 3 for i in range(9))
+    syms, p = [], tuple(range(9))
+    for _ in range(4):
+        syms += [p, tuple(ref[j] for j in p)]
+        p = tuple(rot[j] for j in p)
+    return tuple(syms)
+
+_SYMS = _symmetries()
+# _SYM_MASK[k][m] = 9bit マスク m に対称 k を適用したもの
+_SYM_MASK = tuple(
+    tuple(sum(1 << p[i] for i in range(9) if m >> i & 1) for m in range(512))
+    for p in _SYMS
+)
+
+@lru_cache(maxsize=None)  # 盤面は高々 3^9 通り
+def _canonical(o: int, x: int) -> Tuple[int, int]:
+    """8 対称のうち packed key が最小のものを代表とし (key, k) を返す.
+
+    実盤面の手 a は代表盤面では _SYMS[k][a] に対応する.
+    """
+    best, best_k = _pack_key(o, x), 0
+    for k in range(1, 8):
+        t = _SYM_MASK[k]
+        key = (t[o] << 9) | t[x]
+        if key < best:
+            best, best_k = key, k
+    return best, best_k
+
+def _decode_key(key) -> Board:
+    """保存済みの状態キー → (o, x). 旧形式の文字列キー ("O X  ...") も受け付ける."""
+    if isinstance(key, str):
+        o = sum(1 << i for i, c in enumerate(key) if c == "O")
+        x = sum(1 << i for i, c in enumerate(key) if c == "X")
+        return o, x
+    key = int(key)
+    return key >> 9, key & _FULL
+
+def _canonical_rows(Q, N):
+    """任意形式のキー・実盤面座標の Q/N を代表盤面のキー・座標に揃える.
+
+    正規化済みのキーは k=0 でそのまま。同じ代表盤面に集まった行は
+    訪問回数で重み付け平均 (N が無ければ先勝ち) してまとめる。
+    """
+    Q_out: Dict[int, np.ndarray] = {}
+    N_out: Dict[int, np.ndarray] = {}
+    for k, v in Q.items():
+        key, sym = _canonical(*_decode_key(k))
+        perm = list(_SYMS[sym])
+        q = np.zeros(9)
+        q[perm] = np.asarray(v, dtype=np.float64)
+        n = np.zeros(9, dtype=np.int64)
+        if k in N:
+            n[perm] = np.asarray(N[k], dtype=np.int64)
+        if key not in Q_out:
+            Q_out[key], N_out[key] = q, n
+            continue
+        q0, n0 = Q_out[key], N_out[key]
+        total = n0 + n
+        seen = total > 0
+        q0[seen] = (q0[seen]*n0[seen] + q[seen]*n[seen]) / total[seen]
+        n0 += n
+    return Q_out, N_out
+
 ################################################################################
 # 環境
 ################################################################################
@@ -38,64 +135,65 @@ class TicTacToeEnv:
     WIN_REWARD  = 1.0
     DRAW_REWARD = 0.0
 
-    _WIN_PATTERNS: Tuple[Tuple[int, int, int], ...] = (
-        (0, 1, 2), (3, 4, 5), (6, 7, 8),      # rows
-        (0, 3, 6), (1, 4, 7), (2, 5, 8),      # cols
-        (0, 4, 8), (2, 4, 6),                 # diagonals
-    )
-
     def __init__(self, *, step_penalty: float = -0.04):
         self.step_penalty = step_penalty
-        self.board: Board = [Cell.EMPTY.value] * 9
+        self.board: Board = (0, 0)
 
     def reset(self) -> None:
-        self.board = [Cell.EMPTY.value] * 9
+        self.board = (0, 0)
 
     #----------------------------------------------------------------------
     # 手を進める
     #----------------------------------------------------------------------
     def step(self, action: int):
-        if self.board[action] != Cell.EMPTY.value:
+        o, x = self.board
+        bit = 1 << action
+        if (o | x) & bit:
             raise ValueError(f"Illegal move: {action} not empty")
-        self.board[action] = self._current_player().value
+        if self._current_player() is Cell.O:
+            o |= bit
+        else:
+            x |= bit
+        self.board = (o, x)
         reward, done = self._reward_done()
-        return copy.copy(self.board), reward, done
+        return reward, done
 
     #----------------------------------------------------------------------
     # 内部ヘルパー
     #----------------------------------------------------------------------
     def _current_player(self) -> Cell:
-        # O と X の数が等しいとき O の手番
-        return Cell.O if self.board.count(Cell.O.value) == self.board.count(Cell.X.value) else Cell.X
+        # 置かれた石の数が偶数のとき O の手番
+        o, x = self.board
+        return Cell.O if _POPCOUNT[o | x] % 2 == 0 else Cell.X
 
     def _reward_done(self):
-        winner = self._winner()
-        if winner is not None:
-            return winner.value * self.WIN_REWARD, True
-        if Cell.EMPTY.value not in self.board:
+        o, x = self.board
+        winner = _winner_packed(o, x)           # Cell を作らず +1 / -1 / 0 のまま使う
+        if winner:
+            return winner * self.WIN_REWARD, True
+        if (o | x) == _FULL:
             return self.DRAW_REWARD, True
         return self.step_penalty, False
 
     def _winner(self):
-        for a, b, c in self._WIN_PATTERNS:
-            if self.board[a] != Cell.EMPTY.value and self.board[a] == self.board[b] == self.board[c]:
-                return Cell(self.board[a])
-        return None
+        w = _winner_packed(*self.board)
+        return Cell(w) if w else None
 
     #----------------------------------------------------------------------
     # デバッグ表示
     #----------------------------------------------------------------------
     def render(self):
-        sym = {Cell.O.value: "○", Cell.X.value: "×", Cell.EMPTY.value: " "}
+        o, x = self.board
+        cells = ["○" if o >> i & 1 else "×" if x >> i & 1 else " " for i in range(9)]
         for i in range(0, 9, 3):
-            print("".join(sym[v] for v in self.board[i:i+3]))
+            print("".join(cells[i:i+3]))
 
 ################################################################################
 # モンテカルロエージェント (後手 ×)
 ################################################################################
 class MonteCarloAgent:
     def __init__(self, env: TicTacToeEnv, *, epsilon_start=1.0, epsilon_end=0.01,
-                 min_alpha=0.01, gamma=0.9, learning=True):
+                 min_alpha=0.01, gamma=0.9, learning=True, opponent_prob=0.5):
         self.env = env
         self.eps_start = epsilon_start
         self.eps_end   = epsilon_end
@@ -103,96 +201,305 @@ class MonteCarloAgent:
         self.gamma     = gamma
         self.learning  = learning
         self.epsilon   = epsilon_start   # 更新用
+        self._rand     = random.random   # ホットループ用に束縛しておく
+        self._choice   = random.choice
+
+        self.Q: Dict[int, np.ndarray] = {}
+        self.N: Dict[int, np.ndarray] = {}
 
-        self.Q: Dict[str, List[float]] = defaultdict(lambda: [0.0]*9)
-        self.N: Dict[str, List[int]]   = defaultdict(lambda: [0]*9)
+        # 過去の Q スナップショット。学習中は確率 opponent_prob でここから ◯ を選ぶ
+        self.opponent_prob = opponent_prob
+        self.opponent_pool: List[Dict[int, np.ndarray]] = []
 
     #-------------------------------
     # 基本ヘルパー
     #-------------------------------
     def _legal(self):
-        return [i for i,v in enumerate(self.env.board) if v == Cell.EMPTY.value]
-
-    def _board_key(self):
-        return "".join(str(Cell(v)) for v in self.env.board)
-
-    def _choose_action(self):
+        o, x = self.env.board
+        return _LEGAL[~(o | x) & _FULL]
+
+    def _q(self, key: int) -> np.ndarray:
+        q = self.Q.get(key)
+        if q is None:
+            q = self.Q[key] = np.zeros(9)
+        return q
+
+    def _n(self, key: int) -> np.ndarray:
+        n = self.N.get(key)
+        if n is None:
+            n = self.N[key] = np.zeros(9, dtype=np.int64)
+        return n
+
+    def _choose_action(self, key: int, sym: int):
+        """実盤面の手を返す (Q は代表盤面の座標で引く)."""
         legal = self._legal()
-        if self.learning and random.random() < self.epsilon:
-            return random.choice(legal)
-        q = self.Q[self._board_key()]
-        best = max(q[m] for m in legal)
-        return random.choice([m for m in legal if q[m]==best])
+        if self.learning and self._rand() < self.epsilon:
+            return self._choice(legal)
+        # ndarray の要素アクセスは遅いので tolist() で一括変換し、1 パスで最大手を集める
+        q, perm = self._q(key).tolist(), _SYMS[sym]
+        best, ties = -float("inf"), []
+        for m in legal:
+            v = q[perm[m]]
+            if v > best:
+                best, ties = v, [m]
+            elif v == best:
+                ties.append(m)
+        return ties[0] if len(ties) == 1 else self._choice(ties)
+
+    #-------------------------------
+    # 相手 ◯ (スナップショット)
+    #-------------------------------
+    def snapshot_opponent(self):
+        """現在の Q を相手 ◯ のプールに追加する."""
+        self.opponent_pool.append(copy.deepcopy(self.Q))
+
+    def _opponent_move(self, snapshot: Dict[int, np.ndarray]):
+        """スナップショットの Q から導いた ◯ の greedy 手.
+
+        Q は × 視点の値なので、◯ は打った後の盤面で × が得る最大 Q が
+        最小になる手を選ぶ (勝てる手があれば即勝ち)。
+        """
+        o, x = self.env.board
+        best, ties = float("inf"), []
+        for m in self._legal():
+            o2 = o | 1 << m
+            if _WIN_TABLE[o2]:
+                return m
+            key, sym = _canonical(o2, x)
+            q = snapshot.get(key)
+            if q is None or (o2 | x) == _FULL:
+                v = 0.0
+            else:
+                q, perm = q.tolist(), _SYMS[sym]
+                v = max(q[perm[a]] for a in _LEGAL[~(o2 | x) & _FULL])
+            if v < best:
+                best, ties = v, [m]
+            elif v == best:
+                ties.append(m)
+        return ties[0] if len(ties) == 1 else self._choice(ties)
 
     #-------------------------------
     # 1 エピソード
     #-------------------------------
-    def play_episode(self, ep_idx=0, total_eps=1):
+    def play_episode(self, eps=None):
+        """1 局打つ。`eps` を渡すとその ε で打つ (通常は epsilon_schedule の値)."""
+        if self.learning and eps is not None:
+            self.epsilon = eps
+
+        episode = self._rollout()
         if self.learning:
-            ratio = ep_idx/total_eps
-            self.epsilon = max(self.eps_end, self.eps_start*(1-ratio))
+            self._update_Q(episode)
+        return [s["reward"] for s in episode]
+
+    def epsilon_schedule(self, total_eps: int) -> np.ndarray:
+        """エピソードごとの ε (eps_start から線形減衰し eps_end で下げ止まり)."""
+        ratio = np.arange(total_eps) / total_eps
+        return np.maximum(self.eps_end, self.eps_start*(1 - ratio))
 
+    def _rollout(self):
+        """現在の Q と ε で 1 局打ち、(state, action, reward) の列を返す (更新はしない)."""
         self.env.reset()
         episode = []
         done = False
 
-        # ❶ 先手 ◯ (ランダム)
-        opp = random.choice(self._legal())
+        # 学習中は一定確率で過去の自分を相手にする (それ以外はランダム)
+        snapshot = None
+        if self.learning and self.opponent_pool and self._rand() < self.opponent_prob:
+            snapshot = self._choice(self.opponent_pool)
+
+        # ❶ 先手 ◯
+        opp = self._choice(self._legal()) if snapshot is None else self._opponent_move(snapshot)
         self.env.step(opp)
 
         while not done:
             # ❷ エージェント ×
-            state = self._board_key()
-            act   = self._choose_action()
-            _, env_r, done = self.env.step(act)
+            state, sym = _canonical(*self.env.board)
+            act = self._choose_action(state, sym)
+            env_r, done = self.env.step(act)
 
             # 自分視点の報酬 (+1=勝,-1=負,中間そのまま)
             reward = env_r
             if done and env_r != self.env.DRAW_REWARD:
                 reward = -env_r
-            episode.append(dict(state=state, action=act, reward=reward))
+            episode.append(dict(state=state, action=_SYMS[sym][act], reward=reward))
 
             if done:
                 break
 
-            # ❸ 相手 ◯ 手 (ランダム)
-            opp = random.choice(self._legal())
-            _, _, done = self.env.step(opp)
+            # ❸ 相手 ◯ 手
+            opp = self._choice(self._legal()) if snapshot is None else self._opponent_move(snapshot)
+            _, done = self.env.step(opp)
 
-        if self.learning:
-            self._update_Q(episode)
-        return [s["reward"] for s in episode]
+        return episode
 
     #-------------------------------
     # Monte‑Carlo 価値更新
     #-------------------------------
     def _update_Q(self, episode):
-        for i, step in enumerate(episode):
+        # G_t = r_t + γ·G_{t+1} を後ろから 1 パスで累積
+        G = 0.0
+        for step in reversed(episode):
+            G = step["reward"] + self.gamma*G
             s, a = step["state"], step["action"]
-            G, disc = 0.0, 1.0
-            for j in range(i, len(episode)):
-                G += disc * episode[j]["reward"]
-                disc *= self.gamma
-            self.N[s][a] += 1
-            alpha = max(1/self.N[s][a], self.min_alpha)
-            self.Q[s][a] += alpha*(G - self.Q[s][a])
+            n, q = self._n(s), self._q(s)
+            n[a] += 1
+            alpha = max(1/n[a], self.min_alpha)
+            q[a] += alpha*(G - q[a])
 
     #-------------------------------
     # 保存 / 読込
     #-------------------------------
     def save(self, path: str, *, save_N=True):
+        """Q を .npz (keys: int64, values: float32[n, 9]) で圧縮保存する."""
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        obj = {"Q": dict(self.Q)}
-        if save_N:
-            obj["N"] = dict(self.N)
-        with open(path, "wb") as f:
-            pickle.dump(obj, f)
+        n = len(self.Q)
+        keys: np.ndarray = np.fromiter(self.Q.keys(), dtype=np.int64, count=n)
+        values: np.ndarray = (np.stack(list(self.Q.values())).astype(np.float32) if n
+                              else np.zeros((0, 9), dtype=np.float32))
+        if not save_N:
+            np.savez_compressed(path, keys=keys, values=values)
+            return
+        zeros = np.zeros(9, dtype=np.int64)
+        visits: np.ndarray = (np.stack([self.N.get(k, zeros) for k in self.Q]) if n
+                              else np.zeros((0, 9), dtype=np.int64))
+        np.savez_compressed(path, keys=keys, values=values, visits=visits)
 
     def load(self, path: str):
+        if path.endswith(".npz"):
+            with np.load(path) as z:
+                keys = z["keys"].tolist()
+                self.Q = dict(zip(keys, z["values"].astype(np.float64)))
+                self.N = dict(zip(keys, z["visits"])) if "visits" in z else {}
+            return
+        # 旧形式 (pickle): 文字列キー / 正規化前の int キーを代表盤面へ揃える
         with open(path, "rb") as f:
             obj = pickle.load(f)
-        self.Q = defaultdict(lambda:[0.0]*9, obj["Q"])
-        self.N = defaultdict(lambda:[0]*9,    obj.get("N", {}))
+        self.Q, self.N = _canonical_rows(obj["Q"], obj.get("N", {}))
+
+################################################################################
+# 評価 (greedy × vs ランダム ◯ を NumPy で一括シミュレーション)
+################################################################################
+_BITS      = 1 << np.arange(9)
+_WIN_ARR   = np.frombuffer(_WIN_TABLE, dtype=np.uint8).astype(bool)
+_PERM_ARR  = np.array(_SYMS, dtype=np.intp)
+_SMASK_ARR = np.array(_SYM_MASK, dtype=np.int64)
+
+def evaluate(agent: MonteCarloAgent, games: int = 10_000, *, seed: int | None = None) -> float:
+    """greedy 方策 (ε=0) の勝率. 内訳が必要なら evaluate_outcomes を使う."""
+    return evaluate_outcomes(agent, games, seed=seed)[0]
+
+def evaluate_outcomes(agent: MonteCarloAgent, games: int = 10_000, *,
+                      seed: int | None = None) -> Tuple[float, float, float]:
+    """`games` 局を同時に進め、greedy 方策 (ε=0) の (勝ち, 引分, 負け) 率を返す.
+
+    play_episode を `games` 回呼ぶのと同じ対局 (◯ はランダム、× は Q 最大・
+    同値は乱択) を、全局の (o, x) マスクを配列で持って手番ごとに一括で進める。
+    """
+    rng = np.random.default_rng(seed)
+    # 末尾に番兵キーを足し、未学習状態はすべて最終行 (ゼロ) を引く
+    n_states = len(agent.Q)
+    keys = np.append(np.fromiter(sorted(agent.Q), dtype=np.int64, count=n_states),
+                     np.iinfo(np.int64).max)
+    values = np.zeros((n_states + 1, 9))
+    for i, k in enumerate(keys[:-1].tolist()):
+        values[i] = agent.Q[k]
+
+    o = np.zeros(games, dtype=np.int64)
+    x = np.zeros(games, dtype=np.int64)
+    live = np.ones(games, dtype=bool)
+    won  = np.zeros(games, dtype=bool)
+    idx  = np.arange(games)
+
+    def random_move(occ):
+        empty = (occ[:, None] & _BITS) == 0
+        return np.where(empty, rng.random(empty.shape), -1.0).argmax(axis=1)
+
+    while True:
+        # ❶ 先手 ◯ (ランダム)
+        o[live] |= _BITS[random_move(o[live] | x[live])]
+        live &= ~_WIN_ARR[o] & ((o | x) != _FULL)
+        if not live.any():
+            break
+
+        # ❷ エージェント × (代表盤面で Q を引き、実盤面の座標へ戻す)
+        lo, lx, li = o[live], x[live], idx[live]
+        cand = (_SMASK_ARR[:, lo] << 9) | _SMASK_ARR[:, lx]      # (8, n)
+        k = cand.argmin(axis=0)
+        key = cand[k, np.arange(len(k))]
+        row = np.searchsorted(keys, key)
+        row[keys[row] != key] = n_states
+        q = np.take_along_axis(values[row], _PERM_ARR[k], axis=1)
+        q[((lo | lx)[:, None] & _BITS) != 0] = -np.inf
+        ties = q == q.max(axis=1, keepdims=True)
+        act = np.where(ties, rng.random(ties.shape), -1.0).argmax(axis=1)
+        x[li] |= _BITS[act]
+
+        won[li] = _WIN_ARR[x[li]]
+        live &= ~won
+        if not live.any():
+            break
+
+    lost = _WIN_ARR[o] & ~won
+    return float(won.mean()), float((~won & ~lost).mean()), float(lost.mean())
+
+################################################################################
+# 並列学習 (actor / learner)
+################################################################################
+def _rollout_worker(task):
+    """actor: 固定した Q のスナップショットで ε‑greedy ロールアウトだけを行う."""
+    Q, pool, params, eps_list, seed = task
+    random.seed(seed)
+    env   = TicTacToeEnv(step_penalty=params.pop("step_penalty"))
+    agent = MonteCarloAgent(env, **params)
+    agent.Q.update(Q)
+    agent.opponent_pool = pool
+    episodes = []
+    for eps in eps_list:
+        agent.epsilon = eps
+        episodes.append(agent._rollout())
+    return episodes
+
+def train_parallel(agent: MonteCarloAgent, episodes: int, *, workers: int | None = None,
+                   batch: int = 2_000, seed: int = 0, report: int = 0,
+                   snapshot_every: int = 0):
+    """`workers` プロセスでエピソードを生成し、本プロセス (learner) で Q を更新する.
+
+    各ラウンドで Q をスナップショットして全 actor に配り、actor は `batch`
+    エピソードずつ ε‑greedy で打って軌跡を返す。learner はタスク順に
+    `_update_Q` を適用するので、seed が同じなら結果は再現する。
+    `snapshot_every` > 0 なら、その間隔で Q を相手 ◯ のプールに追加する
+    (間隔は 1 ラウンド = workers*batch エピソード単位に切り上がる)。
+    """
+    workers = workers or os.cpu_count() or 1
+    params = dict(epsilon_start=agent.eps_start, epsilon_end=agent.eps_end,
+                  min_alpha=agent.min_alpha, gamma=agent.gamma,
+                  opponent_prob=agent.opponent_prob, step_penalty=agent.env.step_penalty)
+    eps_schedule = agent.epsilon_schedule(episodes).tolist()
+    next_report = report
+    next_snapshot = snapshot_every
+    done = 0
+    with multiprocessing.Pool(workers) as pool:
+        while done < episodes:
+            Q = {k: v.copy() for k, v in agent.Q.items()}
+            tasks = []
+            for start in range(done, min(done + workers*batch, episodes), batch):
+                stop = min(start + batch, episodes)
+                tasks.append((Q, agent.opponent_pool, dict(params),
+                              eps_schedule[start:stop], seed + start))
+                done = stop
+            for trajectories in pool.imap(_rollout_worker, tasks):
+                for episode in trajectories:
+                    agent._update_Q(episode)
+            # スナップショットはラウンド境界でしか取れないので 1 ラウンド高々 1 回
+            if snapshot_every and done >= next_snapshot:
+                agent.snapshot_opponent()
+                next_snapshot = done + snapshot_every
+            while report and done >= next_report:
+                print(f"{next_report:,} episodes done")
+                next_report += report
+    if eps_schedule:
+        agent.epsilon = eps_schedule[-1]
+    return agent
 
 ################################################################################
 # 学習 & 評価 (スクリプト実行時)
@@ -204,16 +511,10 @@ if __name__ == "__main__":
     EPISODES = 2_000_000
     REPORT   = 100_000
 
-    for ep in range(EPISODES):
-        agent.play_episode(ep, EPISODES)
-        if (ep+1) % REPORT == 0:
-            print(f"{ep+1:,} episodes done")
+    train_parallel(agent, EPISODES, report=REPORT)
 
     # 評価
-    agent.learning = False
-    agent.epsilon  = 0.0
-    wins = sum(agent.play_episode()[-1] > 0 for _ in range(10_000))
-    print(f"Win rate (×後手) : {wins/100:.2f}%")
+    print(f"Win rate (×後手) : {evaluate(agent, 10_000):.2%}")
 
-    agent.save("train_result/mc_tictactoe.pkl")
-    print("✅ Q-table saved to train_result/mc_tictactoe.pkl")
+    agent.save("train_result/mc_tictactoe.npz")
+    print("✅ Q-table saved to train_result/mc_tictactoe.npz")
@@ -1,22 +1,21 @@
-from rl_tictactoe import TicTacToeEnv, MonteCarloAgent
+from rl_tictactoe import TicTacToeEnv, MonteCarloAgent, evaluate_outcomes
 import time, os
 
 def main():
     env   = TicTacToeEnv(step_penalty=-0.04)
-    agent = MonteCarloAgent(env, epsilon=1.0)  # ε は run 中に上書き
+    agent = MonteCarloAgent(env, epsilon_start=1.0)  # ε は run 中に上書き
 
     EPISODES = 300_000
-    for ep in range(EPISODES):
-        agent.play_episode(ep, EPISODES)
+    for eps in agent.epsilon_schedule(EPISODES).tolist():
+        agent.play_episode(eps)
 
     # ---------- 評価 ----------
-    agent.learning = False
-    agent.epsilon  = 0.0
-    wins = sum(agent.play_episode()[-1] >= 0 for _ in range(10_000))
-    print(f"Win rate (×後手) : {wins/100:.2f}%")
+    win, draw, _ = evaluate_outcomes(agent, 10_000)
+    print(f"Win rate (×後手) : {win:.2%}")
+    print(f"Not-lose rate (×後手, 勝ち+引分) : {win + draw:.2%}")
 
     # ---------- 保存 ----------
-    path = "train_result/mc_tictactoe.pkl"
+    path = "train_result/mc_tictactoe.npz"
     os.makedirs("train_result", exist_ok=True)
     agent.save(path)
     print(f"✅ Saved to {path}")
@@ -1,18 +1,22 @@
 # inference.py  –  Stateless Tic-Tac-Toe (AI = 後手 ×, ブロック優先)
+#   mypyc でそのままコンパイルできるよう型注釈を保つこと (README 参照)
 
 from __future__ import annotations
-from typing import List, Dict
-from collections import defaultdict
+from typing import List, Dict, Tuple
 from enum import Enum
+from functools import lru_cache
 import pickle, random, os, os.path as _p
 
+import numpy as np
+
 # ---------------------------------------------------------------------------
 # 型・定数
 # ---------------------------------------------------------------------------
 Board = List[int]                                            # 9 要素, {-1,0,1}
-PKL_PATH = os.getenv(
+_MODEL = _p.join(_p.dirname(__file__), "train_result/mc_tictactoe")
+PKL_PATH = os.getenv(                                        # .npz 優先, 旧 .pkl も可
     "TTT_PKL",
-    _p.join(_p.dirname(__file__), "train_result/mc_tictactoe.pkl")
+    _MODEL + ".npz" if _p.exists(_MODEL + ".npz") else _MODEL + ".pkl"
 )
 
 class Cell(Enum):
@@ -23,91 +27,179 @@ class Cell(Enum):
     def __str__(self) -> str:
         return {0: " ", 1: "O", -1: "X"}[self.value]
 
-_WIN_PATTERNS: tuple[tuple[int, int, int], ...] = (
-    (0, 1, 2), (3, 4, 5), (6, 7, 8),
-    (0, 3, 6), (1, 4, 7), (2, 5, 8),
-    (0, 4, 8), (2, 4, 6),
+_WIN_MASKS: tuple[int, ...] = (
+    0o007, 0o070, 0o700,
+    0o111, 0o222, 0o444,
+    0o421, 0o124,
+)
+_FULL = 0x1FF
+# 空きマス 9bit マスク → 合法手
+_LEGAL = tuple(tuple(i for i in range(9) if m >> i & 1) for m in range(512))
+# 9bit マスク → 揃った列を含むか
+_WIN_TABLE = bytes(any(m & w == w for w in _WIN_MASKS) for m in range(512))
+
+def _symmetries() -> tuple[tuple[int, ...], ...]:
+    # 8 対称 (回転 4 × 鏡映 2)。学習側 rl_tictactoe._symmetries と同じ順序
+    rot = tuple(i % 3 * 3 + 2 - i // 3 for i in range(9))
+    ref = tuple(i // 3 * 3 + 2 - i % 3 for i in range(9))
+    syms, p = [], tuple(range(9))
+    for _ in range(4):
+        syms += [p, tuple(ref[j] for j in p)]
+        p = tuple(rot[j] for j in p)
+    return tuple(syms)
+
+_SYMS = _symmetries()
+_SYM_MASK = tuple(
+    tuple(sum(1 << p[i] for i in range(9) if m >> i & 1) for m in range(512))
+    for p in _SYMS
 )
 
 # ---------------------------------------------------------------------------
 # 純関数ヘルパ
 # ---------------------------------------------------------------------------
-def _winner(b: Board) -> Cell | None:
-    for a, c, d in _WIN_PATTERNS:
-        if b[a] != 0 and b[a] == b[c] == b[d]:
-            return Cell(b[a])
-    return None
-
-def _legal(b: Board) -> List[int]:
-    return [i for i, v in enumerate(b) if v == 0]
-
-def _bstr(b: Board) -> str:
-    return "".join(str(Cell(v)) for v in b)
+def _pack(b: Board) -> tuple[int, int]:
+    """盤面リスト → (o_mask, x_mask)."""
+    o = x = 0
+    for i, v in enumerate(b):
+        if v == 1:
+            o |= 1 << i
+        elif v == -1:
+            x |= 1 << i
+    return o, x
+
+def _unpack(o: int, x: int) -> Board:
+    return [1 if o >> i & 1 else -1 if x >> i & 1 else 0 for i in range(9)]
+
+def _winner_packed(o: int, x: int) -> int:
+    if _WIN_TABLE[o]:
+        return 1
+    if _WIN_TABLE[x]:
+        return -1
+    return 0
+
+def _legal(o: int, x: int) -> tuple[int, ...]:
+    return _LEGAL[~(o | x) & _FULL]
+
+_PRETTY_CHR = "× ○"                                         # b[i] + 1 で引く
 
 def _pretty(b: Board) -> str:
-    sym = {0: " ", 1: "○", -1: "×"}
-    return "\n".join("".join(sym[b[i + j]] for j in range(3)) for i in (0, 3, 6))
-
-def _load_q(path=PKL_PATH) -> Dict[str, List[float]]:
+    c = [_PRETTY_CHR[v + 1] for v in b]
+    return "\n".join("".join(c[i:i + 3]) for i in (0, 3, 6))
+
+def _canonical(o: int, x: int) -> tuple[int, int]:
+    """8 対称のうち packed key (o<<9 | x) が最小のもの → (key, k)."""
+    best, best_k = (o << 9) | x, 0
+    for k in range(1, 8):
+        t = _SYM_MASK[k]
+        key = (t[o] << 9) | t[x]
+        if key < best:
+            best, best_k = key, k
+    return best, best_k
+
+def _load_q(path=PKL_PATH) -> Tuple[Dict[int, int], np.ndarray]:
+    """(状態キー → 行番号, Q 値 [n+1, 9]) を返す。最終行は未学習状態用のゼロ行."""
+    q: Dict = {}
+    n: Dict = {}
     try:
-        with open(path, "rb") as f:
-            q = pickle.load(f)["Q"]
-        return defaultdict(lambda: [0.0]*9, q)
+        if path.endswith(".npz"):
+            with np.load(path) as z:
+                keys = z["keys"].tolist()
+                q = dict(zip(keys, z["values"]))
+                n = dict(zip(keys, z["visits"])) if "visits" in z else {}
+        else:
+            with open(path, "rb") as f:
+                obj = pickle.load(f)
+            q, n = obj["Q"], obj.get("N", {})
     except FileNotFoundError:
-        return defaultdict(lambda: [0.0]*9)
-
-_Q = _load_q()                                              # キャッシュ
+        pass
+    # 旧形式は文字列キー ("O X  ..."), 現行は packed int キー。
+    # どちらも代表盤面へ正規化する (正規化済みのキーは k=0 でそのまま)。
+    # 同じ代表盤面に集まった行は学習側 _canonical_rows と同じく訪問回数で重み付け平均
+    state_to_idx: Dict[int, int] = {}
+    rows: List[np.ndarray] = []
+    visits: List[np.ndarray] = []
+    for k, v in q.items():
+        if isinstance(k, str):
+            o, x = _pack([{"O": 1, "X": -1}.get(c, 0) for c in k])
+        else:
+            o, x = k >> 9, k & 0x1FF
+        key, sym = _canonical(o, x)
+        perm = list(_SYMS[sym])
+        row = np.zeros(9)
+        row[perm] = np.asarray(v, dtype=np.float64)
+        cnt = np.zeros(9, dtype=np.int64)
+        if k in n:
+            cnt[perm] = np.asarray(n[k], dtype=np.int64)
+        i = state_to_idx.get(key)
+        if i is None:
+            state_to_idx[key] = len(rows)
+            rows.append(row)
+            visits.append(cnt)
+            continue
+        total = visits[i] + cnt
+        seen = total > 0
+        rows[i][seen] = (rows[i][seen]*visits[i][seen] + row[seen]*cnt[seen]) / total[seen]
+        visits[i] += cnt
+    rows.append(np.zeros(9))
+    return state_to_idx, np.array(rows)
+
+# × の手番で到達しうる非終局の代表盤面はちょうど 289 状態。Q は 289 × 9
+# (+ゼロ行, float64 で ~21KB) しかないので、ワーカープロセス間で共有メモリ化は
+# せず各プロセスで保持する
+_STATE_IDX, _Q_VALUES = _load_q()                           # キャッシュ
 
 # ---------------------------------------------------------------------------
 # 盤面評価付きプレイ
 # ---------------------------------------------------------------------------
-def play_turn(board: Board, my_move: int) -> Board:
-    """ユーザー(◯) が `my_move` に置いたあと AI(×) が応答する."""
+def play_turn(board: Board, my_move: int) -> tuple[Board, Cell | None, bool]:
+    """ユーザー(◯) が `my_move` に置いたあと AI(×) が応答する.
+
+    戻り値は (新しい盤面, 勝者 or None, 盤面が埋まったか).
+    """
     if board[my_move] != 0:
         raise ValueError(f"position {my_move} is not empty")
 
-    board = board.copy()
-    board[my_move] = Cell.O.value
+    o, x = _pack(board)                         # 以降はビットマスクで進める
+    o |= 1 << my_move
 
-    if _winner(board) or 0 not in board:        # ユーザーが勝ち/引分
-        return board
+    win = _winner_packed(o, x)
+    if not (win or (o | x) == _FULL):           # ユーザーが勝ち/引分でなければ
+        x |= 1 << random.choice(_ai_moves(o, x))
+        win = _winner_packed(o, x)
+    return _unpack(o, x), (Cell(win) if win else None), (o | x) == _FULL
 
-    legal = _legal(board)
+@lru_cache(maxsize=8192)
+def _ai_moves(o: int, x: int) -> tuple[int, ...]:
+    """AI(×) の候補手 (複数なら同値)。到達可能な盤面は高々 5478 なので丸ごとメモ化."""
+    legal = _legal(o, x)
 
-    # --- 優先 1: AI の勝ち手 ---
+    # --- 優先 1: AI の勝ち手 --- (盤面はコピーせずビットを立てて判定)
     for m in legal:
-        tmp = board.copy(); tmp[m] = Cell.X.value
-        if _winner(tmp) == Cell.X:
-            board[m] = Cell.X.value
-            return board
+        if _winner_packed(o, x | 1 << m) == -1:
+            return (m,)
 
     # --- 優先 2: ブロック手 (◯の勝ち阻止) ---
     for m in legal:
-        tmp = board.copy(); tmp[m] = Cell.O.value
-        if _winner(tmp) == Cell.O:
-            board[m] = Cell.X.value
-            return board
-
-    # --- 優先 3: Q 最大 (同値は乱択) ---
-    key = _bstr(board)
-    q = _Q[key]
-    best_q = max(q[m] for m in legal)
-    best_moves = [m for m in legal if q[m] == best_q]
-    board[random.choice(best_moves)] = Cell.X.value
-    return board
+        if _winner_packed(o | 1 << m, x) == 1:
+            return (m,)
+
+    # --- 優先 3: Q 最大 (同値は呼び出し側で乱択) ---
+    key, sym = _canonical(o, x)
+    q, perm = _Q_VALUES[_STATE_IDX.get(key, -1)].tolist(), _SYMS[sym]
+    best_q = max(q[perm[m]] for m in legal)
+    return tuple(m for m in legal if q[perm[m]] == best_q)
 
 # ---------------------------------------------------------------------------
 # JSON 向けラッパ
 # ---------------------------------------------------------------------------
 def play_turn_ex(board: Board, my_move: int) -> dict:
-    new_board = play_turn(board, my_move)
+    new_board, win, full = play_turn(board, my_move)
 
-    win = _winner(new_board)
     if win == Cell.O:
         msg = "あなたの勝ちです!おめでとう！もう一回だ！"
     elif win == Cell.X:
         msg = "あなたの負けです。残念！もう一回！"
-    elif 0 not in new_board:
+    elif full:
         msg = "引き分けです。惜しい！もう一回！"
     else:
         msg = ""